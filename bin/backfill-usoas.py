@@ -23,6 +23,8 @@ class UsoaBackfiller():
         )
 
     def backfill(self):
+        self._add_partition('ONS:GSS:W03')
+
         sql = psycopg2.sql.SQL(
             """
             SELECT
@@ -80,6 +82,24 @@ class UsoaBackfiller():
             with self._dbh.cursor() as cur:
                 cur.execute(sql)
 
+    def _add_partition(self, entity):
+        sql = psycopg2.sql.SQL(
+            """
+            SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'places'::regclass;
+            """
+        )
+        psql = psycopg2.sql.SQL(
+            """
+            SELECT places_add_partition(%s);
+            """
+        )
+        with self._dbh:
+            with self._dbh.cursor() as cur:
+                cur.execute(sql)
+                if cur.rowcount:
+                    logging.info('adding places partition for %s', entity)
+                    cur.execute(psql, (entity,))
+
 
 def main():
     parser = argparse.ArgumentParser(
@@ -52,7 +52,7 @@ class HierarchyBuilder():
                     tree_admin=%(tree_admin)s,
                     tree_census=%(tree_census)s,
                     tree_electoral=%(tree_electoral)s
-                WHERE id = %(id)s;
+                WHERE entity = %(entity)s AND id = %(id)s;
             """
         )
 
@@ -93,6 +93,7 @@ class HierarchyBuilder():
                             'tree_admin': place['tree_admin'],
                             'tree_census': place['tree_census'],
                             'tree_electoral': place['tree_electoral'],
+                            'entity': place['entity'],
                             'id': code
                         }
                     )
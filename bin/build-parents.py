@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 #pylint: disable=missing-module-docstring,missing-function-docstring,invalid-name,missing-class-docstring
 
+from collections import namedtuple
 import json
 import logging
 import os
@@ -14,8 +15,111 @@ from tqdm import tqdm
 from tqdm.contrib.logging import logging_redirect_tqdm
 
 
+PARENT_TYPES = ('admin', 'census', 'electoral')
+
+EntityPlan = namedtuple('EntityPlan', ['placetype', 'sanitise', 'rules', 'history'])
+ParentRule = namedtuple(
+    'ParentRule',
+    ['placetype',
+     'parent_key',
+     'candidates',
+     'candidate_set',
+     'fixed',
+     'overrides']
+)
+
+
+def _check(condition, message, *args):
+    if not condition:
+        raise ValueError('config: ' + message % args)
+
+
+def compile_config(config):
+    _check(isinstance(config, dict), 'expected a JSON object')
+    for section in ('countries', 'overrides', 'sanitise', 'mappings'):
+        _check(isinstance(config.get(section), dict), 'missing or invalid "%s" section', section)
+
+    countries = config['countries']
+    for entity, country in countries.items():
+        _check(isinstance(country, str), 'countries: %s: expected a place id', entity)
+
+    sanitisers = {}
+    for entity, entry in config['sanitise'].items():
+        _check(
+            isinstance(entry, dict) and isinstance(entry.get('pattern'), str) and
+            isinstance(entry.get('repl'), str),
+            'sanitise: %s: expected "pattern" and "repl" strings',
+            entity
+        )
+        try:
+            sanitisers[entity] = (re.compile(entry['pattern']), entry['repl'])
+        except re.error as exc:
+            raise ValueError('config: sanitise: %s: invalid pattern: %s' % (entity, exc)) from exc
+
+    overrides = {placetype: {} for placetype in PARENT_TYPES}
+    for code, entry in config['overrides'].items():
+        _check(isinstance(entry, dict), 'overrides: %s: expected an object', code)
+        for placetype, parent in entry.items():
+            _check(placetype in overrides, 'overrides: %s: unknown parent type %s', code, placetype)
+            _check(isinstance(parent, str), 'overrides: %s: %s: expected a place id', code, placetype)
+            overrides[placetype][code] = parent
+
+    plan = {}
+    for entity, mapping in config['mappings'].items():
+        _check(
+            isinstance(mapping, dict) and isinstance(mapping.get('placetype'), str) and
+            isinstance(mapping.get('parents'), dict),
+            'mappings: %s: expected "placetype" and "parents"',
+            entity
+        )
+
+        rules = []
+        # countries are the root of every hierarchy and never have parents
+        if entity not in countries:
+            for placetype, candidates in mapping['parents'].items():
+                _check(
+                    placetype in PARENT_TYPES,
+                    'mappings: %s: unknown parent type %s',
+                    entity,
+                    placetype
+                )
+                _check(
+                    isinstance(candidates, list) and all(isinstance(c, str) for c in candidates),
+                    'mappings: %s: %s: expected a list of entities',
+                    entity,
+                    placetype
+                )
+                if not candidates:
+                    continue
+
+                fixed = None
+                if len(candidates) == 1 and candidates[0] in countries:
+                    fixed = countries[candidates[0]]
+
+                rules.append(
+                    ParentRule(
+                        placetype=placetype,
+                        parent_key='parent_%s' % placetype,
+                        candidates=tuple(candidates),
+                        candidate_set=frozenset(candidates),
+                        fixed=fixed,
+                        overrides=overrides[placetype]
+                    )
+                )
+
+        plan[entity] = EntityPlan(
+            placetype=mapping['placetype'],
+            sanitise=sanitisers.get(entity),
+            rules=tuple(rules),
+            history=bool(rules)
+        )
+
+    return plan
+
+
 class ParentBuilder():
     def __init__(self, config):
+        self._plan = compile_config(config)
         self._hierarchy = {}
         self._dbh = psycopg2.connect(
             dbname=os.getenv('POSTGRES_DB'),
@@ -24,7 +128,6 @@ class ParentBuilder():
             host=os.getenv('POSTGRES_HOST'),
             cursor_factory=psycopg2.extras.RealDictCursor
         )
-        self._config = config
 
     def build(self):
         self._hierarchy = {}
@@ -46,7 +149,7 @@ class ParentBuilder():
                     progress.update(n=1)
                     entity = row['entity']
                     entity_name = row['entity_name']
-                    if not entity in self._config['mappings']:
+                    if not entity in self._plan:
                         logging.warning('no mapping for entity %s (%s)', entity, entity_name)
                         continue
 
@@ -65,7 +168,7 @@ class ParentBuilder():
                     parent_admin=%(parent_admin)s,
                     parent_electoral=%(parent_electoral)s,
                     parent_census=%(parent_census)s
-                WHERE id=%(place_id)s;
+                WHERE entity=%(entity)s AND id=%(place_id)s;
             """
         )
 
@@ -79,6 +182,7 @@ class ParentBuilder():
                             'parent_admin': entry['parent_admin'],
                             'parent_census': entry['parent_census'],
                             'parent_electoral': entry['parent_electoral'],
+                            'entity': entry['entity'],
                             'place_id': code
                         }
                     )
@@ -103,8 +207,6 @@ class ParentBuilder():
         return None
 
     def _build_entity(self, record):
-        entity = record['entity']
-
         sql = psycopg2.sql.SQL(
             """
             SELECT id, name, name_cym, entity_name, entity_abbr
@@ -119,6 +221,7 @@ class ParentBuilder():
         entity = record['entity']
         entity_name = record['entity_name']
         entity_abbr = record['entity_abbr']
+        plan = self._plan.get(entity)
 
         with self._dbh.cursor() as cur:
             cur.execute(sql, (entity,))
@@ -126,7 +229,7 @@ class ParentBuilder():
             if not cur.rowcount:
                 backfill = True
 
-            elif not entity in self._config['mappings']:
+            elif not plan:
                 logging.error('%s: no configured mapping found!', entity)
 
             else:
@@ -149,62 +252,8 @@ class ParentBuilder():
 
                     logging.debug('starting %s: %s', code, row['name'])
 
-                    history = self._get_change_record(code)
-
-                    place = {
-                        'id': code,
-                        'placetype': self._config['mappings'][entity]['placetype'],
-                        'parent_admin': None,
-                        'parent_electoral': None,
-                        'parent_census': None,
-                        'name': self._sanitise_name(code,
-                                                    row['name']),
-                        'name_alt': row['name_cym'],
-                        'entity': entity,
-                        'entity_name': row['entity_name']
-                    }
-
-                    if entity in self._config['countries']:
-                        logging.debug('skipping parent for country %s', code)
-
-                    else:
-                        for placetype in self._config['mappings'][entity]['parents']:
-                            parent_key = 'parent_%s' % placetype
-                            mappings = self._config['mappings'][entity]['parents'][placetype]
-                            if mappings and history:
-                                parent_candidate = history['parent_gsscode']
-                                if parent_candidate:
-                                    parent_entity = parent_candidate[0:11]
-                                    if parent_entity in mappings:
-                                        place[parent_key] = parent_candidate
-
-                        for placetype, mappings in self._config['mappings'][entity]['parents'].items():
-                            parent_key = 'parent_%s' % placetype
-                            if mappings and not place[parent_key]:
-                                if len(mappings) == 1 and mappings[0] in self._config['countries']:
-                                    place[parent_key] = self._config['countries'][mappings[0]]
-
-                                else:
-                                    parent_code = self._pip_parent(code, mappings)
-                                    if parent_code:
-                                        place[parent_key] = parent_code
-
-                                    elif code in self._config[
-                                        'overrides'] and placetype in self._config['overrides'][code
-                                                                                               ]:
-                                        place[parent_key] = self._config['overrides'][code][
-                                            placetype]
-
-                                    else:
-                                        logging.error(
-                                            '%s: %s: failed to backfill %s -> %s',
-                                            placetype,
-                                            code,
-                                            parent_key,
-                                            ','.join(mappings)
-                                        )
-
-                    self._hierarchy[code] = place
+                    history = self._get_change_record(code) if plan.history else None
+                    self._hierarchy[code] = self._resolve_place(entity, plan, row, history)
 
                 progress.close()
 
@@ -232,7 +281,7 @@ class ParentBuilder():
                             entity_name
                         )
 
-                    elif not entity in self._config['mappings']:
+                    elif not plan:
                         logging.error('%s: no configured mapping found!', entity)
 
                     else:
@@ -244,58 +293,67 @@ class ParentBuilder():
                                 break
 
                             progress.update(n=1)
-                            code = row['id']
-
-                            place = {
-                                'id': code,
-                                'placetype': self._config['mappings'][entity]['placetype'],
-                                'parent_admin': None,
-                                'parent_electoral': None,
-                                'parent_census': None,
-                                'name': self._sanitise_name(code,
-                                                            row['name']),
-                                'name_alt': row['name_cym'],
-                                'entity': entity,
-                                'entity_name': row['entity_name'],
-                                'hierarchy': []
-                            }
-
-                            for placetype, mappings in self._config['mappings'][entity]['parents'].items():
-                                parent_key = 'parent_%s' % placetype
-                                if mappings and not place[parent_key]:
-                                    if len(mappings
-                                          ) == 1 and mappings[0] in self._config['countries']:
-                                        place[parent_key] = self._config['countries'][mappings[0]]
-
-                                    else:
-                                        parent_code = self._pip_parent(code, mappings)
-                                        if parent_code:
-                                            place[parent_key] = parent_code
-
-                                        elif code in self._config[
-                                            'overrides'] and placetype in self._config['overrides'][
-                                                code]:
-                                            place[parent_key] = self._config['overrides'][code][
-                                                placetype]
-
-                                        else:
-                                            logging.error(
-                                                '%s: %s: failed to backfill %s -> %s',
-                                                placetype,
-                                                code,
-                                                parent_key,
-                                                ','.join(mappings)
-                                            )
-
-                            self._hierarchy[code] = place
+                            place = self._resolve_place(entity, plan, row, None)
+                            place['hierarchy'] = []
+                            self._hierarchy[place['id']] = place
 
                         progress.close()
 
-    def _pip_parent(self, code, candidate_entities):
+    def _resolve_place(self, entity, plan, row, history):
+        code = row['id']
+        name = row['name']
+        if plan.sanitise and name is not None:
+            pattern, repl = plan.sanitise
+            name = pattern.sub(repl, name)
+
+        place = {
+            'id': code,
+            'placetype': plan.placetype,
+            'parent_admin': None,
+            'parent_electoral': None,
+            'parent_census': None,
+            'name': name,
+            'name_alt': row['name_cym'],
+            'entity': entity,
+            'entity_name': row['entity_name']
+        }
+
+        if not plan.rules:
+            logging.debug('no parents to resolve for %s', code)
+            return place
+
+        parent_candidate = history['parent_gsscode'] if history else None
+        for rule in plan.rules:
+            if parent_candidate and parent_candidate[0:11] in rule.candidate_set:
+                place[rule.parent_key] = parent_candidate
+
+            elif rule.fixed:
+                place[rule.parent_key] = rule.fixed
+
+            else:
+                parent_code = self._pip_parent(entity, code, rule.candidates)
+                if parent_code:
+                    place[rule.parent_key] = parent_code
+
+                elif code in rule.overrides:
+                    place[rule.parent_key] = rule.overrides[code]
+
+                else:
+                    logging.error(
+                        '%s: %s: failed to backfill %s -> %s',
+                        rule.placetype,
+                        code,
+                        rule.parent_key,
+                        ','.join(rule.candidates)
+                    )
+
+        return place
+
+    def _pip_parent(self, entity, code, candidate_entities):
         sql = psycopg2.sql.SQL(
             """
             SELECT p.id FROM places s, places p
-                WHERE s.id = %s AND
+                WHERE s.entity = %s AND s.id = %s AND
                 p.entity IN %s AND
                 ST_Within(ST_PointOnSurface(s.geom), p.geom);
             """
@@ -303,22 +361,13 @@ class ParentBuilder():
         parent_id = None
 
         with self._dbh.cursor() as cur:
-            cur.execute(sql, (code, tuple(candidate_entities)))
+            cur.execute(sql, (entity, code, candidate_entities))
             row = cur.fetchone()
             if row:
                 parent_id = row['id']
 
         return parent_id
 
-    def _sanitise_name(self, id_, name):
-        entity = id_[0:11]
-        if entity in self._config['sanitise']:
-            pattern = self._config['sanitise'][entity]['pattern']
-            repl = self._config['sanitise'][entity]['repl']
-            return re.sub(rf"{pattern}", repl, name)
-        else:
-            return name
-
 
 def main():
     parser = argparse.ArgumentParser(
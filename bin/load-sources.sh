@@ -8,6 +8,20 @@ function nameify {
     echo "${nameonly}"
 }
 
+function usage {
+    echo >&2 "usage: $(basename "${0}") [-p]"
+    echo >&2 "  -p : create the places table list partitioned by entity"
+    exit 1
+}
+
+PARTITIONED=false
+while getopts "p" opt; do
+    case "${opt}" in
+        p) PARTITIONED=true ;;
+        *) usage ;;
+    esac
+done
+
 if [[ ! -f "$(pwd)/.env" ]]; then
     echo >&2 "ERROR: Couldn't find a .env file; try copying .env.sample and editing it"
     exit 1
@@ -810,4 +824,4 @@ ogr2ogr -f "PostgreSQL" PG:"${DSN}" "${SRCFILE}" \
 # done
 
 ${PSQL} --dbname "${CONNSTR}" --echo-queries -f "${REPO_ROOT}/scripts/fixup-sources.sql"
-${PSQL} --dbname "${CONNSTR}" --echo-queries -f "${REPO_ROOT}/scripts/merge-places.sql"
+${PSQL} --dbname "${CONNSTR}" --echo-queries -v partitioned="${PARTITIONED}" -f "${REPO_ROOT}/scripts/merge-places.sql"
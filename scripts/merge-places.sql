@@ -1,4 +1,48 @@
+-- Run with `psql -v partitioned=true` to create places as a table list partitioned by
+-- entity. Rows are staged in the default partition while entities are assigned and
+-- are then moved into one partition per entity, each with its own spatial index.
+\if :{?partitioned}
+\else
+\set partitioned false
+\endif
+
 DROP TABLE IF EXISTS places;
+\if :partitioned
+CREATE TABLE places (
+     rowid  bigserial,
+     id character varying,
+     name character varying,
+     name_cym character varying,
+     placetype character varying,
+     entity character varying,
+     entity_name character varying,
+     entity_abbr character varying,
+     parent_admin character varying,
+     parent_census character varying,
+     parent_electoral character varying,
+     path_admin ltree,
+     path_census ltree,
+     path_electoral ltree,
+     tree_admin character varying[],
+     tree_census character varying[],
+     tree_electoral character varying[],
+     lng double precision,
+     lat double precision,
+     geom geometry(MultiPolygon,4326)
+) PARTITION BY LIST (entity);
+CREATE TABLE places_default PARTITION OF places DEFAULT;
+
+CREATE OR REPLACE FUNCTION places_add_partition(entity_code character varying)
+    RETURNS void AS $$
+BEGIN
+    EXECUTE format(
+        'CREATE TABLE IF NOT EXISTS %I PARTITION OF places FOR VALUES IN (%L)',
+        'places_' || lower(regexp_replace(entity_code, '[^A-Za-z0-9]+', '_', 'g')),
+        entity_code
+    );
+END
+$$ LANGUAGE plpgsql;
+\else
 CREATE TABLE places (
      rowid  bigserial PRIMARY KEY,
      id character varying,
@@ -21,6 +65,7 @@ CREATE TABLE places (
      lat double precision,
      geom geometry(MultiPolygon,4326)
 );
+\endif
 
 DROP INDEX IF EXISTS places_id_idx;
 DROP INDEX IF EXISTS places_parent_admin_idx;
@@ -31,7 +76,13 @@ DROP INDEX IF EXISTS places_entity_idx;
 DROP INDEX IF EXISTS places_path_admin_idx;
 DROP INDEX IF EXISTS places_path_census_idx;
 DROP INDEX IF EXISTS places_path_electoral_idx;
+DROP INDEX IF EXISTS places_geom_idx;
+\if :partitioned
+-- unique indexes on a partitioned table must include the partition key
+CREATE UNIQUE INDEX places_id_idx ON places USING btree(id, entity);
+\else
 CREATE UNIQUE INDEX places_id_idx ON places USING btree(id);
+\endif
 CREATE INDEX places_parent_admin_idx ON places USING btree(parent_admin);
 CREATE INDEX places_parent_census_idx ON places USING btree(parent_census);
 CREATE INDEX places_parent_electoral_idx ON places USING btree(parent_electoral);
@@ -159,6 +210,17 @@ UPDATE places
         entity_abbr=(SELECT 'SOA')
 	WHERE substring(id,1,10) = 'NISRA:SOA:';
 
+\if :partitioned
+ALTER TABLE places DETACH PARTITION places_default;
+ALTER TABLE places_default RENAME TO places_staging;
+SELECT places_add_partition(entity)
+    FROM (SELECT DISTINCT entity FROM places_staging WHERE entity IS NOT NULL) AS entities;
+CREATE TABLE places_default PARTITION OF places DEFAULT;
+INSERT INTO places SELECT * FROM places_staging;
+DROP TABLE places_staging;
+CREATE INDEX places_geom_idx ON places USING gist(geom);
+\endif
+
 DROP TABLE IF EXISTS mgs_dz, mgs_iz;
 DROP TABLE IF EXISTS nrs_oa;
 DROP TABLE IF EXISTS nisra_oa, nisra_sa, nisra_soa;